@@ -6,18 +6,30 @@ Global configuration settings for the PumpFun Token Parser application.
 WEBSOCKET_URI = "wss://pumpportal.fun/api/data"
 WEBSOCKET_RECONNECT_DELAY = 30  # seconds
 WEBSOCKET_PING_INTERVAL = 45    # seconds
+MESSAGE_QUEUE_SIZE = 1000       # Pending websocket messages before the oldest is dropped
+MESSAGE_WORKERS = 8             # Concurrent message handlers
 
 # Database Configuration
 DATABASE_URL = "sqlite:///database/tokens.db"
+TOKEN_FLUSH_BATCH_SIZE = 50      # Buffered tokens written per transaction
+TOKEN_FLUSH_INTERVAL = 2.0       # seconds between forced buffer flushes
+MAX_RETRY_TOKENS = 4 * TOKEN_FLUSH_BATCH_SIZE  # Failed-write rows kept for retry; older ones are dropped
+WAL_CHECKPOINT_INTERVAL = 60     # seconds between WAL truncating checkpoints
 
 # Token Security Settings
 MAX_SECURITY_SCORE = 5000  # Maximum security score for token validation
+RUGCHECK_CACHE_SIZE = 4096   # Number of token reports kept in memory
+RUGCHECK_CACHE_TTL = 60      # seconds a token report is reused
 
 # Trader Analytics Configuration
 DEFAULT_MIN_TRANSACTIONS = 5     # Minimum transactions for trader analysis
 TOP_HOLDERS_LIMIT = 20          # Number of top holders to analyze
 ANALYSIS_TIMEFRAME_DAYS = 7     # Default timeframe for transaction analysis
-HELIUS_PAGE_SIZE = 1000        # Maximum number of token accounts per page
+WALLET_TRANSACTIONS_LIMIT = 100  # Recent transactions analyzed per wallet (API max 100)
+ANALYTICS_CACHE_SIZE = 100     # Tokens kept in the holders / price caches
+HOLDERS_CACHE_TTL = 60         # seconds token holders are reused
+PRICE_CACHE_TTL = 10           # seconds a token price is reused
+WALLET_ANALYSIS_CACHE_TTL = 300 # seconds a stored wallet analysis is reused
 
 # Logging Configuration
 LOG_DIR = "./utils/logs"
@@ -33,6 +45,7 @@ LOG_LEVELS = {
 API_ENDPOINTS = {
     "HELIUS": {
         "BASE_URL": "https://mainnet.helius-rpc.com/?api-key=",
+        "TRANSACTIONS_URL": "https://api.helius.xyz/v0/addresses/{address}/transactions",
         "METHODS": {
             "TOKEN_ACCOUNTS": "getTokenAccountsByOwner",
             "GET_SIGNATURES": "getSignaturesForAddress",
@@ -41,6 +54,14 @@ API_ENDPOINTS = {
     }
 }
 
+# Client-side request pacing (requests per second), so 429s stay the exception
+RUGCHECK_RATE_LIMIT = 10
+SOLSNIFFER_RATE_LIMIT = 10
+HELIUS_RATE_LIMIT = 10         # match the Helius plan's requests per second
+HELIUS_MAX_CONCURRENCY = 16    # Helius requests in flight at once
+HELIUS_REQUEST_TIMEOUT = 30    # seconds for a whole non-streamed Helius request
+RATE_LIMIT_RETRY_DELAY = 1  # seconds to wait on 429 when no Retry-After is sent
+
 # HTTP Headers
 DEFAULT_HEADERS = {
     "Content-Type": "application/json",
@@ -1,13 +1,19 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Float, inspect
+from sqlalchemy import create_engine, event, insert, Column, String, Integer, DateTime, Float, Index, LargeBinary, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
-import json
+import asyncio
+import hashlib
+import orjson
 import os
+import threading
 from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
 
 from utils.logger_config import logger
-from config import DATABASE_URL
+from config import DATABASE_URL, WAL_CHECKPOINT_INTERVAL, ANALYSIS_TIMEFRAME_DAYS, WALLET_ANALYSIS_CACHE_TTL
 
 Base = declarative_base()
 
@@ -17,13 +23,18 @@ class Token(Base):
     mint = Column(String, unique=True, index=True)
     symbol = Column(String)
     score = Column(Integer)
-    risks = Column(String)
+    risks = Column(LargeBinary)  # orjson-encoded list, decode with orjson.loads
 
 class TraderAnalysis(Base):
     __tablename__ = 'trader_analysis'
+    __table_args__ = (
+        # Latest analysis per token / per wallet
+        Index('ix_trader_token_analyzed', 'token_address', 'analyzed_at'),
+        Index('ix_trader_wallet_analyzed', 'wallet_address', 'analyzed_at'),
+    )
     id = Column(Integer, primary_key=True)
-    token_address = Column(String, index=True)
-    wallet_address = Column(String, index=True)
+    token_address = Column(String)
+    wallet_address = Column(String)
     balance = Column(Float)
     total_transactions = Column(Integer)
     successful_trades = Column(Integer)
@@ -32,19 +43,72 @@ class TraderAnalysis(Base):
     last_active = Column(DateTime)
     analyzed_at = Column(DateTime, index=True)
 
+class WalletAnalysis(Base):
+    """Latest transaction metrics of a wallet, reused across tokens."""
+    __tablename__ = 'wallet_analysis'
+    cache_key = Column(String, primary_key=True)
+    wallet_address = Column(String, index=True)
+    total_transactions = Column(Integer)
+    successful_trades = Column(Integer)
+    failed_trades = Column(Integer)
+    unique_tokens_traded = Column(Integer)
+    last_active = Column(DateTime)
+    analyzed_at = Column(DateTime, index=True)
+
+_WALLET_METRICS = ('total_transactions', 'successful_trades', 'failed_trades',
+                   'unique_tokens_traded', 'last_active')
+
+def wallet_cache_key(wallet_address: str) -> str:
+    """Key a wallet analysis by wallet and analysis timeframe."""
+    return hashlib.sha256(f"{wallet_address}{ANALYSIS_TIMEFRAME_DAYS}".encode()).hexdigest()
+
+# Built once and reused for every token write; re-emitted mints are skipped by
+# SQLite instead of raising IntegrityError
+_TOKEN_INSERT = sqlite_insert(Token).on_conflict_do_nothing(index_elements=['mint'])
+
+_TRADER_ANALYSIS_INSERT = insert(TraderAnalysis)
+
+# Re-analyzed wallets overwrite their previous row
+_wallet_insert = sqlite_insert(WalletAnalysis)
+_WALLET_ANALYSIS_UPSERT = _wallet_insert.on_conflict_do_update(
+    index_elements=['cache_key'],
+    set_={name: _wallet_insert.excluded[name]
+          for name in ('wallet_address', *_WALLET_METRICS, 'analyzed_at')}
+)
+
 class DatabaseManager:
-    _instance = None
+    # One manager per database URL, so e.g. tokens and analytics can live in
+    # separate SQLite files whose writers don't contend
+    _instances: dict[str, "DatabaseManager"] = {}
+    _lock = threading.Lock()
 
     def __new__(cls, db_url: str = DATABASE_URL):
-        if cls._instance is None:
-            cls._instance = super(DatabaseManager, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
+        instance = cls._instances.get(db_url)
+        if instance is None:
+            with cls._lock:
+                instance = cls._instances.get(db_url)
+                if instance is None:
+                    instance = super(DatabaseManager, cls).__new__(cls)
+                    cls._instances[db_url] = instance
+        return instance
 
     def __init__(self, db_url: str = DATABASE_URL):
-        if self._initialized:
+        # Cheap check first so repeated construction skips the engine setup
+        if getattr(self, '_initialized', False):
             return
 
+        with self._lock:
+            if getattr(self, '_initialized', False):
+                return
+            self._initialize(db_url)
+
+    def _initialize(self, db_url: str):
+        # Session shared by every write made while handling a single request
+        # (e.g. one websocket message), so they land in one commit
+        self._request_session: ContextVar[Session | None] = ContextVar(
+            f"request_session:{db_url}", default=None
+        )
+
         try:
             # Ensure database directory exists
             db_dir = os.path.dirname(db_url.replace('sqlite:///', ''))
@@ -52,18 +116,35 @@ class DatabaseManager:
                 os.makedirs(db_dir)
                 logger.info(f"Created database directory: {db_dir}")
 
-            # Configure engine with connection pooling
+            # Configure engine with connection pooling. SQLite has a single
+            # writer, so a small pool is enough; the busy timeout makes
+            # concurrent writers wait for the lock instead of failing.
             self.engine = create_engine(
                 db_url,
                 poolclass=QueuePool,
-                pool_size=5,
-                max_overflow=10,
+                pool_size=2,
+                max_overflow=4,
                 pool_timeout=30,
-                pool_recycle=1800
+                pool_recycle=1800,
+                pool_pre_ping=True,
+                connect_args={"check_same_thread": False, "timeout": 30}
             )
+
+            # Tune every new SQLite connection: WAL lets readers and the writer
+            # proceed concurrently and NORMAL sync avoids an fsync per commit.
+            @event.listens_for(self.engine, "connect")
+            def _set_sqlite_pragmas(dbapi_conn, _):
+                cursor = dbapi_conn.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA temp_store=MEMORY")
+                cursor.execute("PRAGMA cache_size=-64000")
+                cursor.execute("PRAGMA mmap_size=268435456")
+                cursor.close()
             
             self._verify_database()
-            self.SessionLocal = scoped_session(sessionmaker(bind=self.engine))
+            self._session_factory = sessionmaker(bind=self.engine)
+            self.SessionLocal = scoped_session(self._session_factory)
             self._initialized = True
             logger.info("Database initialized successfully with connection pooling.")
         except Exception as e:
@@ -77,9 +158,15 @@ class DatabaseManager:
         try:
             # Create tables if they don't exist
             Base.metadata.create_all(self.engine)
+
+            # create_all skips existing tables, so add indexes introduced
+            # after a database was first created
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(self.engine, checkfirst=True)
             
             # Verify that all required tables were created
-            required_tables = {table.__tablename__ for table in [Token, TraderAnalysis]}
+            required_tables = {table.__tablename__ for table in [Token, TraderAnalysis, WalletAnalysis]}
             existing_tables = set(inspector.get_table_names())
             
             missing_tables = required_tables - existing_tables
@@ -104,46 +191,167 @@ class DatabaseManager:
         finally:
             session.close()
 
-    def store_token(self, token_data: dict):
-        with self.get_session() as session:
-            token = Token(
-                mint=token_data.get('mint'),
-                symbol=token_data.get('tokenMeta', {}).get('symbol'),
-                score=token_data.get('score'),
-                risks=json.dumps(token_data.get('risks'))
-            )
-            session.add(token)
-            try:
+    def get_request_session(self) -> Session:
+        """Return the session of the current request, creating it on first use."""
+        session = self._request_session.get()
+        if session is None:
+            # Not the thread-local SessionLocal: concurrent tasks on the event
+            # loop thread must each get their own session.
+            session = self._session_factory()
+            self._request_session.set(session)
+        return session
+
+    def close_request_session(self, commit: bool = True):
+        """Commit (or roll back) and close the session of the current request."""
+        session = self._request_session.get()
+        if session is None:
+            return
+        self._request_session.set(None)
+        try:
+            if commit:
                 session.commit()
-                logger.info(f"Stored token data: {token}", extra={'token_name': token.symbol})
-            except Exception as e:
-                logger.error(f"Failed to store token data: {e}", extra={'token_name': token.symbol})
-                raise
+            else:
+                session.rollback()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to commit request session: {e}")
+            raise
+        finally:
+            session.close()
+
+    @contextmanager
+    def _write_session(self):
+        """Yield the current request session, or a self-committing one outside a request."""
+        session = self._request_session.get()
+        if session is not None:
+            yield session
+        else:
+            with self.get_session() as session:
+                yield session
+
+    @staticmethod
+    def build_token_row(token_data: dict) -> dict:
+        """Build the tokens table row for a RugCheck report."""
+        risks = token_data.get('risks')
+        return {
+            'mint': token_data.get('mint'),
+            'symbol': token_data.get('tokenMeta', {}).get('symbol'),
+            'score': token_data.get('score'),
+            'risks': orjson.dumps(risks) if risks is not None else None
+        }
+
+    def store_token(self, token_data: dict):
+        row = self.build_token_row(token_data)
+        try:
+            with self._write_session() as session:
+                session.execute(_TOKEN_INSERT, row)
+            logger.info(f"Stored token data: {row['mint']}", extra={'token_name': row['symbol']})
+        except Exception as e:
+            logger.error(f"Failed to store token data: {e}", extra={'token_name': row['symbol']})
+            raise
+
+    def bulk_store_tokens(self, rows: list[dict]):
+        """Store a batch of token rows in a single transaction, skipping known mints."""
+        if not rows:
+            return
+        try:
+            with self._write_session() as session:
+                session.execute(_TOKEN_INSERT, rows)
+            logger.info(f"Stored {len(rows)} tokens in one batch")
+        except Exception as e:
+            logger.error(f"Failed to store token batch: {e}")
+            raise
 
     def store_trader_analysis(self, analysis_data: dict):
+        analysis = TraderAnalysis(
+            token_address=analysis_data.get('token_address'),
+            wallet_address=analysis_data.get('wallet_address'),
+            balance=analysis_data.get('balance'),
+            total_transactions=analysis_data.get('total_transactions'),
+            successful_trades=analysis_data.get('successful_trades'),
+            failed_trades=analysis_data.get('failed_trades'),
+            unique_tokens_traded=analysis_data.get('unique_tokens_traded'),
+            last_active=analysis_data.get('last_active'),
+            analyzed_at=analysis_data.get('analyzed_at')
+        )
+        try:
+            with self._write_session() as session:
+                session.add(analysis)
+            logger.info(f"Stored trader analysis", 
+                    extra={'module_name': 'TraderAnalytics', 
+                            'wallet': analysis_data.get('wallet_address')})
+        except Exception as e:
+            logger.error(f"Failed to store trader analysis: {e}", 
+                        extra={'module_name': 'TraderAnalytics', 
+                            'wallet': analysis_data.get('wallet_address')})
+            raise
+
+    def store_trader_analyses_bulk(self, rows: list[dict]):
+        """Store many trader analysis rows with one executemany in a single transaction."""
+        if not rows:
+            return
+        try:
+            with self._write_session() as session:
+                session.execute(_TRADER_ANALYSIS_INSERT, rows)
+            logger.info(f"Stored {len(rows)} trader analyses in one batch", 
+                    extra={'module_name': 'TraderAnalytics'})
+        except Exception as e:
+            logger.error(f"Failed to store trader analysis batch: {e}", 
+                        extra={'module_name': 'TraderAnalytics'})
+            raise
+
+    def get_cached_wallet_analyses(self, wallet_addresses: list[str],
+                                   older_than: float = WALLET_ANALYSIS_CACHE_TTL) -> dict[str, dict]:
+        """Return stored analyses younger than `older_than` seconds, keyed by wallet."""
+        if not wallet_addresses:
+            return {}
+        cutoff = datetime.now() - timedelta(seconds=older_than)
+        keys = [wallet_cache_key(wallet) for wallet in wallet_addresses]
         with self.get_session() as session:
-            analysis = TraderAnalysis(
-                token_address=analysis_data.get('token_address'),
-                wallet_address=analysis_data.get('wallet_address'),
-                balance=analysis_data.get('balance'),
-                total_transactions=analysis_data.get('total_transactions'),
-                successful_trades=analysis_data.get('successful_trades'),
-                failed_trades=analysis_data.get('failed_trades'),
-                unique_tokens_traded=analysis_data.get('unique_tokens_traded'),
-                last_active=analysis_data.get('last_active'),
-                analyzed_at=analysis_data.get('analyzed_at')
-            )
-            session.add(analysis)
+            rows = session.query(WalletAnalysis).filter(
+                WalletAnalysis.cache_key.in_(keys),
+                WalletAnalysis.analyzed_at >= cutoff
+            ).all()
+            return {
+                row.wallet_address: {name: getattr(row, name) for name in _WALLET_METRICS}
+                for row in rows
+            }
+
+    def store_wallet_analyses(self, analyses: dict[str, dict], analyzed_at: datetime | None = None):
+        """Store freshly computed wallet analyses, replacing older ones."""
+        if not analyses:
+            return
+        analyzed_at = analyzed_at or datetime.now()
+        rows = [
+            {
+                'cache_key': wallet_cache_key(wallet),
+                'wallet_address': wallet,
+                **{name: analysis.get(name) for name in _WALLET_METRICS},
+                'analyzed_at': analyzed_at
+            }
+            for wallet, analysis in analyses.items()
+        ]
+        try:
+            with self._write_session() as session:
+                session.execute(_WALLET_ANALYSIS_UPSERT, rows)
+        except Exception as e:
+            logger.error(f"Failed to store wallet analyses: {e}", 
+                        extra={'module_name': 'TraderAnalytics'})
+            raise
+
+    def checkpoint(self):
+        """Copy the WAL back into the database file and truncate it."""
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def checkpoint_loop(self, interval: float = WAL_CHECKPOINT_INTERVAL):
+        """Checkpoint the WAL every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
             try:
-                session.commit()
-                logger.info(f"Stored trader analysis", 
-                        extra={'module_name': 'TraderAnalytics', 
-                                'wallet': analysis_data.get('wallet_address')})
+                await asyncio.to_thread(self.checkpoint)
             except Exception as e:
-                logger.error(f"Failed to store trader analysis: {e}", 
-                            extra={'module_name': 'TraderAnalytics', 
-                                'wallet': analysis_data.get('wallet_address')})
-                raise
+                logger.error(f"WAL checkpoint failed: {e}")
 
     def close(self):
         self.SessionLocal.remove()
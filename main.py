@@ -1,16 +1,20 @@
 import asyncio
 import argparse
+from typing import TYPE_CHECKING
 from modules.pumpfun_parser import PumpFunParser
-from modules.trader_analytics import TraderAnalytics
 import sys
 
+if TYPE_CHECKING:
+    from modules.trader_analytics import TraderAnalytics
+
+from utils.http import HttpClient
 from utils.logger_config import logger
 from config import (
     WEBSOCKET_URI,
     DEFAULT_MIN_TRANSACTIONS
 )
 
-async def monitor_new_tokens(ws_uri: str, trader_analytics: TraderAnalytics | None = None):
+async def monitor_new_tokens(ws_uri: str, trader_analytics: "TraderAnalytics | None" = None):
     """Monitor new tokens in real-time with optional trader analytics."""
     if trader_analytics:
         async with trader_analytics as ta:
@@ -38,6 +42,8 @@ def print_trader_info(trader):
 
 async def analyze_specific_token(token_address: str, api_key: str):
     """Analyze traders for a specific token."""
+    from modules.trader_analytics import TraderAnalytics
+
     async with TraderAnalytics(api_key) as analytics:
         print(f"\nAnalyzing traders for token: {token_address}")
         traders = await analytics.get_top_traders(token_address)
@@ -51,7 +57,7 @@ async def analyze_specific_token(token_address: str, api_key: str):
             print(f"\n{i}.", end="")
             print_trader_info(trader)
             
-        analytics.store_trader_analysis(token_address, traders)
+        await asyncio.to_thread(analytics.store_trader_analysis, token_address, traders)
         print("\nTrader analysis completed and stored in database.")
 
 def print_menu():
@@ -72,6 +78,8 @@ async def main():
         # Initialize trader analytics with Helius API key if provided
         trader_analytics = None
         if args.api_key:
+            # Imported lazily: analytics are only loaded when an API key is given
+            from modules.trader_analytics import TraderAnalytics
             trader_analytics = TraderAnalytics(api_key=args.api_key)
 
         while True:
@@ -114,8 +122,33 @@ async def main():
     except ValueError as e:
         logger.error(str(e))
         sys.exit(1)
+    finally:
+        await HttpClient.close()
+
+def raise_open_file_limit():
+    """Raise the soft open-file limit to the hard limit (not available on Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # An unlimited hard limit can't be applied as a soft one (e.g. macOS)
+    if soft < hard and hard != resource.RLIM_INFINITY:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not raise open file limit from {soft}: {e}")
 
 if __name__ == "__main__":
+    # libuv-based event loop where available (not on Windows)
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    # Each pooled HTTP connection and the websocket hold a descriptor
+    raise_open_file_limit()
+
     try:
         asyncio.run(main())
     finally:
@@ -1,33 +1,47 @@
 import asyncio
-import json
+import logging
+import orjson
 import signal
+import time
+from typing import TYPE_CHECKING
 
 from modules.rug_check import RugCheck
-from modules.trader_analytics import TraderAnalytics
 from database.database import DatabaseManager
-from websockets.exceptions import ConnectionClosedError
+from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
 from websockets.asyncio.client import connect
 
 from utils.logger_config import logger
 from config import (
     WEBSOCKET_RECONNECT_DELAY,
     WEBSOCKET_PING_INTERVAL,
-    MAX_SECURITY_SCORE
+    MESSAGE_QUEUE_SIZE,
+    MESSAGE_WORKERS,
+    MAX_SECURITY_SCORE,
+    TOKEN_FLUSH_BATCH_SIZE,
+    TOKEN_FLUSH_INTERVAL,
+    MAX_RETRY_TOKENS
 )
 
+if TYPE_CHECKING:
+    from modules.trader_analytics import TraderAnalytics
+
 class PumpFunParser:
-    def __init__(self, ws_uri: str, trader_analytics: TraderAnalytics | None = None, 
+    def __init__(self, ws_uri: str, trader_analytics: "TraderAnalytics | None" = None, 
                  reconnect_delay: int = WEBSOCKET_RECONNECT_DELAY, 
-                 ping_interval: int = WEBSOCKET_PING_INTERVAL):
+                 ping_interval: int = WEBSOCKET_PING_INTERVAL,
+                 num_workers: int = MESSAGE_WORKERS):
         self.ws_uri = ws_uri
         self.reconnect_delay = reconnect_delay
         self.ping_interval = ping_interval
+        self.num_workers = num_workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MESSAGE_QUEUE_SIZE)
         self.rug_check = RugCheck()
         self.trader_analytics = trader_analytics
         self.db_manager = DatabaseManager()
         self.ws = None
         self.shutdown_event = asyncio.Event()
-        self.token_list = []
+        self._pending_tokens: list[dict] = []
+        self._last_flush = time.monotonic()
     
     async def __aenter__(self):
         return self
@@ -35,11 +49,56 @@ class PumpFunParser:
     async def __aexit__(self, exc_type, exc_value, traceback):
         if self.ws and not self.ws.close_code:
             await self.ws.close()
+        self.flush_tokens()
         self.db_manager.close()
 
-    async def handle_message(self, message: str):
-        data = json.loads(message)
-        logger.debug(f"Received data: {data}", extra={'module_name': 'PumpFun', 'token_name': data.get('name', 'N/A')})
+    def _take_pending_tokens(self) -> list[dict]:
+        """Empty the token buffer and return its rows."""
+        pending, self._pending_tokens = self._pending_tokens, []
+        self._last_flush = time.monotonic()
+        return pending
+
+    def flush_tokens(self):
+        """Write all buffered tokens to the database in one transaction."""
+        self.db_manager.bulk_store_tokens(self._take_pending_tokens())
+
+    async def _store_tokens(self, tokens: list[dict]):
+        """Write a token batch in its own transaction, re-buffering it on failure."""
+        try:
+            await asyncio.to_thread(self.db_manager.bulk_store_tokens, tokens)
+        except Exception:
+            # Already logged; keep the newest rows so the next flush retries
+            # them, but bound the backlog while the database keeps failing
+            room = max(MAX_RETRY_TOKENS - len(self._pending_tokens), 0)
+            dropped, kept = tokens[:len(tokens) - room], tokens[len(tokens) - room:]
+            if dropped:
+                logger.error(f"Dropped {len(dropped)} tokens after a failed write: "
+                             f"{', '.join(str(row['mint']) for row in dropped)}",
+                             extra={'module_name': 'PumpFun'})
+            self._pending_tokens[:0] = kept
+
+    async def flush_loop(self, interval: float = TOKEN_FLUSH_INTERVAL):
+        """Flush buffered tokens that have waited `interval` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            if self._pending_tokens and time.monotonic() - self._last_flush >= interval:
+                await self._store_tokens(self._take_pending_tokens())
+
+    def _persist(self, mint: str, top_traders: list[dict]):
+        """Write one message's trader analyses in a single request session (blocking)."""
+        self.db_manager.get_request_session()
+        try:
+            self.trader_analytics.store_trader_analysis(mint, top_traders)
+        except Exception:
+            self.db_manager.close_request_session(commit=False)
+            raise
+        else:
+            self.db_manager.close_request_session()
+
+    async def handle_message(self, message: bytes | str):
+        data = orjson.loads(message)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received data: %s", data, extra={'module_name': 'PumpFun', 'token_name': data.get('name', 'N/A')})
         
         mint = data.get('mint')
         if mint:
@@ -48,23 +107,55 @@ class PumpFunParser:
                 logger.error(f"Token {mint} failed security filters.", extra={'module_name': 'PumpFun','token_name': data.get('name', 'N/A')})
                 return
             
-            self.db_manager.store_token(token_data)
-            
-            # Analyze top traders if trader analytics is available
+            # Fetch trader analytics before opening the request session so the
+            # SQLite write lock is never held across network round-trips
+            top_traders = None
             if self.trader_analytics:
                 try:
                     top_traders = await self.trader_analytics.get_top_traders(mint)
-                    if top_traders:
-                        self.trader_analytics.store_trader_analysis(mint, top_traders)
-                        logger.info(f"Stored trader analysis for {len(top_traders)} traders", 
-                                  extra={'module_name': 'PumpFun', 'token_name': data.get('name', 'N/A')})
                 except Exception as e:
                     logger.error(f"Failed to analyze traders: {str(e)}", 
                                extra={'module_name': 'PumpFun', 'token_name': data.get('name', 'N/A')})
 
+            # The token buffer is only touched here, on the event loop thread
+            self._pending_tokens.append(self.db_manager.build_token_row(token_data))
+            # Full batches are flushed here; flush_loop handles the time limit
+            tokens = []
+            if len(self._pending_tokens) >= TOKEN_FLUSH_BATCH_SIZE:
+                tokens = self._take_pending_tokens()
+
+            # Commits block on disk I/O, so run them off the event loop. The
+            # batch holds other messages' tokens, so it is committed on its own
+            # and never rolled back with this message's trader analyses.
+            if tokens:
+                await self._store_tokens(tokens)
+            if top_traders:
+                await asyncio.to_thread(self._persist, mint, top_traders)
+                logger.info(f"Stored trader analysis for {len(top_traders)} traders", 
+                          extra={'module_name': 'PumpFun', 'token_name': data.get('name', 'N/A')})
+
+    def enqueue_message(self, message: bytes | str):
+        """Queue a message for the workers, dropping the oldest one when full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            logger.warning("Message queue is full, dropping the oldest message.")
+        self.queue.put_nowait(message)
+
+    async def _worker(self):
+        """Handle queued messages until cancelled."""
+        while True:
+            message = await self.queue.get()
+            try:
+                await self.handle_message(message)
+            except Exception as e:
+                logger.exception(f"Failed to handle message: {e}")
+            finally:
+                self.queue.task_done()
+
     async def subscribe(self, ws):
         payload = {"method": "subscribeNewToken"}
-        await ws.send(json.dumps(payload))
+        await ws.send(orjson.dumps(payload).decode())
         logger.info("Subscribed to new token events.")
 
     async def listen(self):
@@ -77,8 +168,14 @@ class PumpFunParser:
                     self.ws = ws
                     logger.info("WebSocket connection established.")
                     await self.subscribe(ws)
-                    async for message in ws:
-                        await self.handle_message(message)  # type: ignore
+                    while True:
+                        try:
+                            # Keep text frames as raw bytes: orjson parses them
+                            # directly, without building an intermediate str
+                            message = await ws.recv(decode=False)
+                        except ConnectionClosedOK:
+                            break
+                        self.enqueue_message(message)
                         if self.shutdown_event.is_set():
                             logger.warning("Shutdown event detected. Breaking out of message loop.")
                             break
@@ -108,7 +205,20 @@ class PumpFunParser:
             loop.add_signal_handler(sig, self.handle_signal, sig, None)
         
         async with self.rug_check:
-            await self.listen()
+            # Receiving stays on the websocket loop; RugCheck lookups and DB
+            # writes for different mints run concurrently in the workers
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+            # Keep the WAL file from growing unbounded under sustained inserts
+            checkpointer = asyncio.create_task(self.db_manager.checkpoint_loop())
+            # Write buffered tokens even when no new token arrives to trigger it
+            flusher = asyncio.create_task(self.flush_loop())
+            try:
+                await self.listen()
+            finally:
+                for task in (*workers, checkpointer, flusher):
+                    task.cancel()
+                await asyncio.gather(*workers, checkpointer, flusher, return_exceptions=True)
+                self.flush_tokens()
 
     async def passes_security_filters(self, token_data):
         if token_data.get('score', None) <= MAX_SECURITY_SCORE:
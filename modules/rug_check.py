@@ -1,31 +1,59 @@
-import aiohttp
 import asyncio
+import logging
+import orjson
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
 
+from utils.http import HttpClient, retry_delay
 from utils.logger_config import logger  # Centralized logger
+from config import (
+    RUGCHECK_CACHE_SIZE,
+    RUGCHECK_CACHE_TTL,
+    RUGCHECK_RATE_LIMIT
+)
 
 class RugCheck:
+    def __init__(self):
+        self._cache = TTLCache(maxsize=RUGCHECK_CACHE_SIZE, ttl=RUGCHECK_CACHE_TTL)
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._limiter = AsyncLimiter(max_rate=RUGCHECK_RATE_LIMIT, time_period=1)
+
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = await HttpClient.session()
         return self
     
     async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.session.close()
+        pass
     
     async def __make_request(self, base_url: str, token_address: str):
         while True:
+            await self._limiter.acquire()
             async with self.session.get(f'{base_url}/{token_address}/report') as response:
                 if response.status == 429:
                     logger.warning("Rate limit exceeded", extra={'token_name': token_address})
-                    await asyncio.sleep(10)
+                    await asyncio.sleep(retry_delay(response))
                     continue
                 elif response.status in (200, 400):
-                    return await response.json()
+                    return orjson.loads(await response.read())
                 else:
                     logger.error(f"Unexpected status code: {response.status}", extra={'token_name': token_address})
                     raise Exception(f"Unexpected status code: {response.status}")
 
     async def analyze_token(self, token_address: str):
-        logger.debug(f"Analyzing token: {token_address}", extra={'token_name': token_address})
+        """Analyze a token, reusing recent reports and coalescing concurrent lookups."""
+        cached = self._cache.get(token_address)
+        if cached is not None:
+            return cached
+
+        task = self._in_flight.get(token_address)
+        if task is None:
+            task = asyncio.create_task(self._analyze_token(token_address))
+            self._in_flight[token_address] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(token_address, None))
+        return await asyncio.shield(task)
+
+    async def _analyze_token(self, token_address: str):
+        logger.debug("Analyzing token: %s", token_address, extra={'token_name': token_address})
         token_data = await self.__make_request('https://api.rugcheck.xyz/v1/tokens', token_address)
         if "error" in token_data:
             logger.error(f"Token {token_address} not found", extra={'token_name': token_address})
@@ -40,8 +68,10 @@ class RugCheck:
                 logger.error(f"Token {symbol} has {risk_count} risks", extra={'token_name': symbol})
             elif risk_count > 1 and risk_count <= 3:
                 logger.warning(f"Token {symbol} has {risk_count} risks", extra={'token_name': symbol})
-            for risk in token_data.get('risks'):
-                logger.debug(f"Risk: {risk.get('name', 'N/A')}", extra={'token_name': symbol})
-                logger.debug(f"Description: {risk.get('description', 'N/A')}", extra={'token_name': symbol})
-                logger.debug(f"Level: {risk.get('level', 'N/A')}", extra={'token_name': symbol})
+            if logger.isEnabledFor(logging.DEBUG):
+                for risk in token_data.get('risks'):
+                    logger.debug("Risk: %s", risk.get('name', 'N/A'), extra={'token_name': symbol})
+                    logger.debug("Description: %s", risk.get('description', 'N/A'), extra={'token_name': symbol})
+                    logger.debug("Level: %s", risk.get('level', 'N/A'), extra={'token_name': symbol})
+        self._cache[token_address] = token_data
         return token_data
\ No newline at end of file
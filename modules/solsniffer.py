@@ -1,34 +1,42 @@
 import asyncio
-import aiohttp
+import orjson
 import questionary
+from aiolimiter import AsyncLimiter
 from typing import Union
 
+from utils.http import HttpClient, retry_delay
 from utils.logger_config import logger
+from config import SOLSNIFFER_RATE_LIMIT
 
 class SolSniffer:
     module_name = "SolSniffer"
+    # Sent per request: the session is shared with other clients
+    headers = {
+        "accept": "*/*",
+        "Content-Type": "application/json",
+        "Host": "solsniffer.com"
+    }
+    
+    def __init__(self):
+        self._limiter = AsyncLimiter(max_rate=SOLSNIFFER_RATE_LIMIT, time_period=1)
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = await HttpClient.session()
         return self
     
     async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.session.close()
+        pass
 
     async def __make_request(self, base_url: str, params: Union[dict, None] = None):
-        self.session.headers.update({
-            "accept": "*/*",
-            "Content-Type": "application/json",
-            "Host": "solsniffer.com"
-        })
         while True:
-            async with self.session.get(f'{base_url}', params=params) as response:
+            await self._limiter.acquire()
+            async with self.session.get(f'{base_url}', params=params, headers=self.headers) as response:
                 if response.status == 429:
                     logger.warning("Rate limit exceeded", extra={'module_name': self.module_name})
-                    await asyncio.sleep(10)
+                    await asyncio.sleep(retry_delay(response))
                     continue
                 elif response.status in (200, 400, 404):
-                    return await response.json()
+                    return orjson.loads(await response.read())
                 else:
                     logger.error(f"Unexpected status code: {response.status}", extra={'module_name': self.module_name})
                     raise Exception(f"Unexpected status code: {response.status}")
@@ -1,11 +1,18 @@
 import aiohttp
 import asyncio
+import base58
+import base64
+import heapq
+import ijson
+import orjson
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
 
 from database.database import DatabaseManager
+from utils.http import HttpClient
 from utils.logger_config import logger
 from config import (
     API_ENDPOINTS,
@@ -13,9 +20,28 @@ from config import (
     DEFAULT_MIN_TRANSACTIONS,
     TOP_HOLDERS_LIMIT,
     ANALYSIS_TIMEFRAME_DAYS,
-    HELIUS_PAGE_SIZE
+    WALLET_TRANSACTIONS_LIMIT,
+    ANALYTICS_CACHE_SIZE,
+    HOLDERS_CACHE_TTL,
+    PRICE_CACHE_TTL,
+    HELIUS_RATE_LIMIT,
+    HELIUS_MAX_CONCURRENCY,
+    HELIUS_REQUEST_TIMEOUT
 )
 
+# Applied to every call except the streamed getProgramAccounts download, which
+# may legitimately take longer and relies on the session's per-read timeout
+_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=HELIUS_REQUEST_TIMEOUT)
+
+# JSON-RPC envelope serialized once; only id, method and params are filled in
+_RPC_TEMPLATE = b'{"jsonrpc":"2.0","id":%b,"method":%b,"params":%b}'
+
+
+def _rpc_body(request_id: str, method: str, params: list) -> bytes:
+    """Serialize a single JSON-RPC request."""
+    return _RPC_TEMPLATE % (orjson.dumps(request_id), orjson.dumps(method), orjson.dumps(params))
+
+
 class TraderAnalytics:
     def __init__(self, api_key: Optional[str] = None):
         if not api_key:
@@ -23,142 +49,193 @@ class TraderAnalytics:
         self.api_key = api_key
         self.base_url = f"{API_ENDPOINTS['HELIUS']['BASE_URL']}{api_key}"
         self.db_manager = DatabaseManager()
-        self.headers = DEFAULT_HEADERS.copy()
+        self.headers = DEFAULT_HEADERS  # read-only, sent with every request
         self.session = None
-        self.executor = ThreadPoolExecutor(max_workers=10)
+        self._holders_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=HOLDERS_CACHE_TTL)
+        self._price_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=PRICE_CACHE_TTL)
+        self._in_flight: Dict[tuple, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(HELIUS_MAX_CONCURRENCY)
+        self._limiter = AsyncLimiter(max_rate=HELIUS_RATE_LIMIT, time_period=1)
 
     async def __aenter__(self):
-        if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+        self.session = await HttpClient.session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
-        self.executor.shutdown(wait=False)
         self.db_manager.close()
 
-    @lru_cache(maxsize=100)
+    @asynccontextmanager
+    async def _request_slot(self):
+        """Bound concurrent Helius requests and pace them under the plan's rate limit."""
+        async with self._semaphore:
+            await self._limiter.acquire()
+            yield
+
+    async def _cached(self, cache: TTLCache, token_address: str, 
+                      fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        """Return a cached value, fetching it once even when requested concurrently."""
+        cached = cache.get(token_address)
+        if cached is not None:
+            return cached
+
+        key = (fetch.__name__, token_address)
+        task = self._in_flight.get(key)
+        if task is None:
+            async def fetch_and_store():
+                value = await fetch(token_address)
+                # Failed lookups come back empty and are retried next time
+                if value:
+                    cache[token_address] = value
+                return value
+
+            task = asyncio.create_task(fetch_and_store())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
     async def get_token_holders(self, token_address: str) -> List[Dict]:
         """Get token holders using Helius API with caching."""
-        if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+        return await self._cached(self._holders_cache, token_address, self._fetch_token_holders)
+
+    async def _fetch_token_holders(self, token_address: str) -> List[Dict]:
+        try:
+            # The requests are independent, so overlap their round-trips;
+            # decimals are only needed once both have completed. If one fails
+            # the group cancels the other, releasing its request slot.
+            async with asyncio.TaskGroup() as tg:
+                metadata_task = tg.create_task(self._fetch_token_metadata(token_address))
+                accounts_task = tg.create_task(self._fetch_top_accounts(token_address))
+        except ExceptionGroup as eg:
+            logger.error(f"Error fetching token holders: {'; '.join(str(e) for e in eg.exceptions)}", 
+                       extra={'module_name': 'TraderAnalytics'})
+            return []
+        token_metadata, top_holders = metadata_task.result(), accounts_task.result()
+
+        decimals = token_metadata["decimals"]
+        symbol = token_metadata["symbol"]
+        scale = 10 ** decimals
+        return [
+            {
+                "owner": base58.b58encode(owner).decode(),
+                "amount": amount / scale,
+                "decimals": decimals,
+                "symbol": symbol
+            }
+            for amount, owner in sorted(top_holders, reverse=True)
+        ]
 
-        holders = []
+    async def _fetch_token_metadata(self, token_address: str) -> Dict:
+        """Get a token's decimals and symbol, falling back to SPL defaults."""
         token_metadata = {
             "decimals": 9,  # Default to 9 decimals for SPL tokens
             "symbol": "UNKNOWN"  # Default symbol
         }
-        
-        try:
-            # First get token metadata
-            metadata_payload = {
-                "jsonrpc": "2.0",
-                "id": "token-sniper",
-                "method": "getTokenMetadata",
-                "params": [token_address]
-            }
+        metadata_body = _rpc_body("token-sniper", "getTokenMetadata", [token_address])
 
-            async with self.session.post(self.base_url, json=metadata_payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if "error" in data:
-                        logger.error(f"API error getting token metadata: {data['error']}", 
-                                   extra={'module_name': 'TraderAnalytics'})
-                    else:
-                        result = data.get("result", {})
-                        token_metadata.update({
-                            "decimals": result.get("decimals", 9),
-                            "symbol": result.get("symbol", "UNKNOWN")
-                        })
-
-            # Now get token accounts
-            accounts_payload = {
-                "jsonrpc": "2.0",
-                "id": "token-sniper",
-                "method": "getProgramAccounts",
-                "params": [
-                    "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+        async with self._request_slot(), self.session.post(self.base_url, data=metadata_body, headers=self.headers, timeout=_REQUEST_TIMEOUT) as response:
+            if response.status == 200:
+                data = orjson.loads(await response.read())
+                if "error" in data:
+                    logger.error(f"API error getting token metadata: {data['error']}", 
+                               extra={'module_name': 'TraderAnalytics'})
+                else:
+                    result = data.get("result", {})
+                    token_metadata.update({
+                        "decimals": result.get("decimals", 9),
+                        "symbol": result.get("symbol", "UNKNOWN")
+                    })
+        return token_metadata
+
+    async def _fetch_top_accounts(self, token_address: str) -> List[tuple]:
+        """Return (raw amount, raw owner) of the largest token accounts of a mint."""
+        # Min-heap of (raw amount, raw owner) holding the largest holders seen
+        top_holders: List[tuple] = []
+        accounts_body = _rpc_body("token-sniper", "getProgramAccounts", [
+            "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+            {
+                # Only fetch owner (bytes 32..64) and amount (64..72)
+                # instead of the whole parsed account
+                "encoding": "base64",
+                "dataSlice": {
+                    "offset": 32,
+                    "length": 40
+                },
+                "filters": [
                     {
-                        "encoding": "jsonParsed",
-                        "filters": [
-                            {
-                                "dataSize": 165
-                            },
-                            {
-                                "memcmp": {
-                                    "offset": 0,
-                                    "bytes": token_address
-                                }
-                            }
-                        ]
+                        "dataSize": 165
+                    },
+                    {
+                        "memcmp": {
+                            "offset": 0,
+                            "bytes": token_address
+                        }
                     }
                 ]
             }
+        ])
 
-            async with self.session.post(self.base_url, json=accounts_payload) as accounts_response:
-                if accounts_response.status == 200:
-                    accounts_data = await accounts_response.json()
-                    if "error" in accounts_data:
-                        logger.error(f"API error getting accounts: {accounts_data['error']}", 
-                                   extra={'module_name': 'TraderAnalytics'})
-                        return []
-                    
-                    accounts = accounts_data.get("result", [])
-                    
-                    # Process accounts in parallel using ThreadPoolExecutor
-                    def process_account(account):
-                        parsed_data = account.get("account", {}).get("data", {}).get("parsed", {})
-                        info = parsed_data.get("info", {})
-                        
-                        if parsed_data.get("type") == "account":
-                            owner = info.get("owner")
-                            amount = info.get("tokenAmount", {})
-                            
-                            if owner and amount and amount.get("uiAmount", 0) > 0:
-                                return {
-                                    "owner": owner,
-                                    "amount": amount.get("uiAmount", 0),
-                                    "decimals": token_metadata["decimals"],
-                                    "symbol": token_metadata["symbol"]
-                                }
-                        return None
-
-                    # Process accounts in parallel
-                    loop = asyncio.get_event_loop()
-                    processed_accounts = await loop.run_in_executor(
-                        self.executor,
-                        lambda: list(filter(None, map(process_account, accounts)))
-                    )
-                    
-                    holders.extend(processed_accounts)
+        async with self._request_slot(), self.session.post(self.base_url, data=accounts_body, headers=self.headers) as accounts_response:
+            if accounts_response.status != 200:
+                logger.error(f"Failed to get token accounts: {accounts_response.status}", 
+                           extra={'module_name': 'TraderAnalytics'})
+                return top_holders
 
-        except Exception as e:
-            logger.error(f"Error fetching token holders: {str(e)}", 
-                       extra={'module_name': 'TraderAnalytics'})
-            return []
+            # Stream-parse the (potentially huge) account list and keep
+            # only the top holders, so memory stays O(TOP_HOLDERS_LIMIT)
+            # regardless of how many accounts the mint has
+            account_count = 0
+            # Body read before the first account; a JSON-RPC error fits in it
+            head = b""
+            accounts = ijson.sendable_list()
+            parser = ijson.items_coro(accounts, "result.item")
+            # Hot loop over every account: bind lookups to locals and
+            # only touch the heap for amounts above its current minimum
+            b64decode, from_bytes = base64.b64decode, int.from_bytes
+            heappush, heapreplace = heapq.heappush, heapq.heapreplace
+            floor = 0
+            async for chunk in accounts_response.content.iter_any():
+                if not account_count:
+                    head += chunk
+                parser.send(chunk)
+                account_count += len(accounts)
+                for account in accounts:
+                    raw = b64decode(account["account"]["data"][0])
+                    amount = from_bytes(raw[32:40], "little")
+                    if amount <= floor:
+                        continue
+                    if len(top_holders) < TOP_HOLDERS_LIMIT:
+                        heappush(top_holders, (amount, raw[:32]))
+                        if len(top_holders) == TOP_HOLDERS_LIMIT:
+                            floor = top_holders[0][0]
+                    else:
+                        heapreplace(top_holders, (amount, raw[:32]))
+                        floor = top_holders[0][0]
+                del accounts[:]
+            parser.close()
 
-        # Sort holders by amount and return top holders
-        holders.sort(key=lambda x: x.get("amount", 0), reverse=True)
-        return holders[:TOP_HOLDERS_LIMIT]
+            if not account_count:
+                # JSON-RPC errors come back as 200 without a "result"
+                error = orjson.loads(head).get("error") if head else None
+                if error:
+                    logger.error(f"API error getting token accounts: {error}", 
+                               extra={'module_name': 'TraderAnalytics'})
+                else:
+                    logger.warning(f"No token accounts returned for {token_address}", 
+                                 extra={'module_name': 'TraderAnalytics'})
+        return top_holders
 
     async def get_token_price(self, token_address: str) -> float:
-        """Get token price in USD."""
-        if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+        """Get token price in USD with caching."""
+        return await self._cached(self._price_cache, token_address, self._fetch_token_price)
 
+    async def _fetch_token_price(self, token_address: str) -> float:
         try:
             # Using Helius API for price info
-            price_payload = {
-                "jsonrpc": "2.0",
-                "id": "token-sniper",
-                "method": "getAssetPricing",
-                "params": [token_address]
-            }
+            price_body = _rpc_body("token-sniper", "getAssetPricing", [token_address])
 
-            async with self.session.post(self.base_url, json=price_payload) as response:
+            async with self._request_slot(), self.session.post(self.base_url, data=price_body, headers=self.headers, timeout=_REQUEST_TIMEOUT) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = orjson.loads(await response.read())
                     if "error" in data:
                         logger.error(f"API error getting token price: {data['error']}", 
                                    extra={'module_name': 'TraderAnalytics'})
@@ -174,105 +251,94 @@ class TraderAnalytics:
     async def analyze_wallet_transactions(self, wallet_address: str, 
                                         start_time: Optional[datetime] = None) -> Dict:
         """Analyze transactions for a specific wallet."""
-        if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+        analyses = await self._analyze_wallets([wallet_address], start_time)
+        return analyses.get(wallet_address, {})
 
+    async def _analyze_wallets(self, wallet_addresses: List[str], 
+                               start_time: Optional[datetime] = None) -> Dict[str, Dict]:
+        """Analyze transactions for several wallets concurrently."""
+        # Stored analyses are only valid for the default timeframe
+        use_cache = not start_time
         if not start_time:
             start_time = datetime.now() - timedelta(days=ANALYSIS_TIMEFRAME_DAYS)
 
-        try:
-            # Get signatures for address
-            signatures_payload = {
-                "jsonrpc": "2.0",
-                "id": "token-sniper",
-                "method": API_ENDPOINTS["HELIUS"]["METHODS"]["GET_SIGNATURES"],
-                "params": [
-                    wallet_address,
-                    {
-                        "limit": 100
-                    }
-                ]
-            }
+        # Wallets recur across tokens, so reuse recent analyses before asking Helius
+        cached = {}
+        if use_cache:
+            try:
+                cached = await asyncio.to_thread(self.db_manager.get_cached_wallet_analyses, wallet_addresses)
+            except Exception as e:
+                logger.error(f"Failed to read cached wallet analyses, fetching all wallets: {str(e)}", 
+                           extra={'module_name': 'TraderAnalytics'})
+        missing = [wallet for wallet in wallet_addresses if wallet not in cached]
+
+        # Requests are bounded by _request_slot. A failing wallet is logged and
+        # skipped inside _fetch_wallet_transactions, so one bad wallet never
+        # cancels the others; the group only propagates cancellation.
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(self._fetch_wallet_transactions(wallet)) for wallet in missing]
+        # Enhanced Transactions has no time filter, so trim to the timeframe here
+        start_ts = start_time.timestamp()
+        analyses = {
+            wallet: self._process_wallet_transactions(
+                [tx for tx in task.result() if (tx.get("timestamp") or 0) >= start_ts]
+            )
+            for wallet, task in zip(missing, tasks)
+            if task.result() is not None
+        }
+        if use_cache and analyses:
+            try:
+                await asyncio.to_thread(self.db_manager.store_wallet_analyses, analyses)
+            except Exception as e:
+                # The fresh analyses are still returned, just not reused later
+                logger.warning(f"Wallet analyses were not cached: {str(e)}", 
+                             extra={'module_name': 'TraderAnalytics'})
+        return {**cached, **analyses}
 
-            async with self.session.post(self.base_url, json=signatures_payload) as response:
+    async def _fetch_wallet_transactions(self, wallet_address: str) -> Optional[List[Dict]]:
+        """Get a wallet's recent parsed transactions in a single Enhanced Transactions call."""
+        url = API_ENDPOINTS["HELIUS"]["TRANSACTIONS_URL"].format(address=wallet_address)
+        params = {"api-key": self.api_key, "limit": WALLET_TRANSACTIONS_LIMIT}
+        try:
+            async with self._request_slot(), self.session.get(url, params=params, headers=self.headers, timeout=_REQUEST_TIMEOUT) as response:
                 if response.status == 200:
-                    data = await response.json()
-                    if "error" in data:
-                        logger.error(f"API error: {data['error']}", 
-                                   extra={'module_name': 'TraderAnalytics'})
-                        return {}
-                        
-                    signatures = data.get("result", [])
-                    
-                    # Get transaction details concurrently
-                    async def get_transaction(sig):
-                        tx_payload = {
-                            "jsonrpc": "2.0",
-                            "id": "token-sniper",
-                            "method": API_ENDPOINTS["HELIUS"]["METHODS"]["GET_TRANSACTION"],
-                            "params": [
-                                sig.get("signature"),
-                                {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
-                            ]
-                        }
-                        
-                        if not self.session:
-                            self.session = aiohttp.ClientSession(headers=self.headers)
-
-                        async with self.session.post(self.base_url, json=tx_payload) as tx_response:
-                            if tx_response.status == 200:
-                                tx_data = await tx_response.json()
-                                if not "error" in tx_data:
-                                    return tx_data.get("result", {})
-                            return None
-
-                    # Process transactions concurrently
-                    tasks = [get_transaction(sig) for sig in signatures[:10]]
-                    transactions = await asyncio.gather(*tasks)
-                    transactions = [tx for tx in transactions if tx is not None]
-                    
-                    return self._process_wallet_transactions(transactions)
-                else:
-                    logger.error(f"Failed to get wallet transactions: {response.status}", 
-                               extra={'module_name': 'TraderAnalytics'})
-                    return {}
+                    return orjson.loads(await response.read())
+                logger.error(f"Failed to get wallet transactions: {response.status}", 
+                           extra={'module_name': 'TraderAnalytics', 'address': wallet_address})
         except Exception as e:
             logger.error(f"Error analyzing wallet: {str(e)}", 
-                       extra={'module_name': 'TraderAnalytics'})
-            return {}
+                       extra={'module_name': 'TraderAnalytics', 'address': wallet_address})
+        return None
 
     def _process_wallet_transactions(self, transactions: List[Dict]) -> Dict:
-        """Process wallet transactions to extract meaningful metrics."""
-        metrics = {
-            "total_transactions": len(transactions),
-            "successful_trades": 0,
-            "failed_trades": 0,
-            "unique_tokens_traded": set(),
-            "last_active": None
-        }
+        """Process wallet transactions to extract meaningful metrics in a single pass."""
+        successful_trades = 0
+        last_active_ts = 0  # epoch seconds; converted to a datetime once at the end
+        mints = set()
+        mints_update = mints.update
 
         for tx in transactions:
-            if not tx.get("meta", {}).get("err"):
-                metrics["successful_trades"] += 1
-            else:
-                metrics["failed_trades"] += 1
+            get = tx.get
+            if not get("transactionError"):
+                successful_trades += 1
 
             # Update last active timestamp
-            block_time = tx.get("blockTime")
-            if block_time:
-                timestamp = datetime.fromtimestamp(block_time)
-                if not metrics["last_active"] or timestamp > metrics["last_active"]:
-                    metrics["last_active"] = timestamp
-
-            # Track unique tokens from token transfers
-            for ix in tx.get("meta", {}).get("innerInstructions", []):
-                if "tokenTransfers" in ix:
-                    for transfer in ix["tokenTransfers"]:
-                        if "mint" in transfer:
-                            metrics["unique_tokens_traded"].add(transfer["mint"])
-
-        metrics["unique_tokens_traded"] = len(metrics["unique_tokens_traded"])
-        return metrics
+            block_time = get("timestamp")
+            if block_time and block_time > last_active_ts:
+                last_active_ts = block_time
+
+            # Track unique tokens from token transfers; set.update drains the
+            # generator without a Python-level add per transfer
+            mints_update(transfer["mint"] for transfer in get("tokenTransfers") or () if "mint" in transfer)
+
+        total_transactions = len(transactions)
+        return {
+            "total_transactions": total_transactions,
+            "successful_trades": successful_trades,
+            "failed_trades": total_transactions - successful_trades,
+            "unique_tokens_traded": len(mints),
+            "last_active": datetime.fromtimestamp(last_active_ts) if last_active_ts else None
+        }
 
     async def get_top_traders(self, token_address: str, min_transactions: int = DEFAULT_MIN_TRANSACTIONS) -> List[Dict]:
         """Identify top traders for a specific token based on transaction history."""
@@ -283,29 +349,25 @@ class TraderAnalytics:
         first_holder = holders[0] if holders else None
         symbol = first_holder.get("symbol", "UNKNOWN") if first_holder else "UNKNOWN"
         
-        # Process holders concurrently
-        async def process_holder(holder):
-            wallet = holder.get("owner")
-            if not wallet:
-                return None
+        # Analyze all holders' wallets concurrently
+        # get_token_holders already returns at most TOP_HOLDERS_LIMIT entries
+        top_holders = [holder for holder in holders if holder.get("owner")]
+        analyses = await self._analyze_wallets([holder["owner"] for holder in top_holders])
 
-            analysis = await self.analyze_wallet_transactions(wallet)
+        top_traders = []
+        for holder in top_holders:
+            wallet = holder["owner"]
+            analysis = analyses.get(wallet, {})
             if analysis.get("total_transactions", 0) >= min_transactions:
                 amount = holder.get("amount", 0)
-                return {
+                top_traders.append({
                     "wallet": wallet,
                     "balance": amount,
                     "balance_usd": amount * token_price if token_price else 0,
                     "decimals": holder.get("decimals", 9),
                     "symbol": symbol,
                     **analysis
-                }
-            return None
-
-        # Process all holders concurrently
-        tasks = [process_holder(holder) for holder in holders[:TOP_HOLDERS_LIMIT]]
-        traders = await asyncio.gather(*tasks)
-        top_traders = [trader for trader in traders if trader is not None]
+                })
 
         return sorted(top_traders, 
                      key=lambda x: (x.get("successful_trades", 0), x.get("balance", 0)), 
@@ -314,8 +376,8 @@ class TraderAnalytics:
     def store_trader_analysis(self, token_address: str, trader_data: List[Dict]):
         """Store trader analysis results in the database."""
         timestamp = datetime.now()
-        for trader in trader_data:
-            self.db_manager.store_trader_analysis({
+        self.db_manager.store_trader_analyses_bulk([
+            {
                 "token_address": token_address,
                 "wallet_address": trader["wallet"],
                 "balance": trader["balance"],
@@ -325,4 +387,6 @@ class TraderAnalytics:
                 "unique_tokens_traded": trader["unique_tokens_traded"],
                 "last_active": trader["last_active"],
                 "analyzed_at": timestamp
-            }) 
\ No newline at end of file
+            }
+            for trader in trader_data
+        ]) 
\ No newline at end of file
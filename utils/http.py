@@ -0,0 +1,48 @@
+import aiohttp
+import orjson
+
+from config import RATE_LIMIT_RETRY_DELAY
+
+
+def retry_delay(response: aiohttp.ClientResponse) -> float:
+    """Seconds to wait before retrying a 429 response, honouring Retry-After."""
+    try:
+        return float(response.headers.get("Retry-After", RATE_LIMIT_RETRY_DELAY))
+    except ValueError:
+        # Retry-After may also be an HTTP date
+        return RATE_LIMIT_RETRY_DELAY
+
+
+class HttpClient:
+    """
+    Process-wide aiohttp session shared by RugCheck, SolSniffer and TraderAnalytics.
+    One connector means one connection pool and one DNS cache for every host the
+    application talks to. Close it once, on application shutdown.
+    """
+    _session: aiohttp.ClientSession | None = None
+
+    @classmethod
+    async def session(cls) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use."""
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=200,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True
+            )
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                json_serialize=lambda obj: orjson.dumps(obj).decode(),
+                # Per-socket limits only: a total cap here would also cut off
+                # long streamed downloads; clients set their own totals
+                timeout=aiohttp.ClientTimeout(sock_connect=10, sock_read=30)
+            )
+        return cls._session
+
+    @classmethod
+    async def close(cls):
+        """Close the shared session."""
+        if cls._session is not None:
+            await cls._session.close()
+            cls._session = None
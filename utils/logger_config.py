@@ -1,7 +1,10 @@
+import atexit
 import logging
+import queue
 import colorlog
 import os
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
 # Ensure the logs directory exists
 log_dir = './utils/logs'
@@ -56,6 +59,10 @@ if not logger.hasHandlers():
     file_handler.setFormatter(file_formatter)
     console_handler.setFormatter(console_formatter)
 
-    # Add handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Log calls only enqueue records; a background thread does the file and
+    # console writes so they never block the event loop
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)